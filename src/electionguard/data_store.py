@@ -31,6 +31,14 @@ class DataStore(Generic[T, U], Iterable):
     def __iter__(self) -> Iterator:
         return iter(self._store.items())
 
+    def __contains__(self, key: object) -> bool:
+        """
+        Check if key is in store
+        :param key: key
+        :return: True if the key is in the store
+        """
+        return key in self._store
+
     def all(self) -> List[Optional[U]]:
         """
         Get all `CiphertextAcceptedBallot` from the store
@@ -1,4 +1,5 @@
-from typing import Iterable, List, Optional
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Optional, Tuple
 
 from .auxiliary import AuxiliaryDecrypt, AuxiliaryEncrypt
 from .data_store import DataStore
@@ -17,40 +18,87 @@ from .key_ceremony import (
 )
 from .logs import log_warning
 from .rsa import rsa_decrypt, rsa_encrypt
+from .scheduler import Scheduler
+from .schnorr import SchnorrProof, batch_verify_schnorr_proofs
 from .types import GUARDIAN_ID
 
+PARALLEL_VERIFICATION_MIN_GUARDIANS = 4
+"""
+Fewest guardians with backups for which coefficient proofs are verified in parallel,
+below this the process pool overhead outweighs the work
+"""
+
 
 class KeyCeremonyMediator:
     """
     KeyCeremonyMediator for assisting communication between guardians 
     """
 
+    __slots__ = (
+        "ceremony_details",
+        "_auxiliary_public_keys",
+        "_auxiliary_public_keys_snapshot",
+        "_election_public_keys",
+        "_election_public_keys_snapshot",
+        "_joint_key",
+        "_election_partial_key_backups",
+        "_election_partial_key_backups_by_designated",
+        "_election_partial_key_challenges",
+        "_election_partial_key_verifications",
+        "_failed_partial_key_verifications",
+        "_backups_verified",
+        "_guardians",
+        "_attendance_count",
+        "_number_of_guardians",
+        "_required_total_backups",
+    )
+
     ceremony_details: CeremonyDetails
 
     _auxiliary_public_keys: DataStore[GUARDIAN_ID, AuxiliaryPublicKey]
+    _auxiliary_public_keys_snapshot: Optional[Tuple[AuxiliaryPublicKey, ...]]
     _election_public_keys: DataStore[GUARDIAN_ID, ElectionPublicKey]
-    _election_partial_key_backups: DataStore[GuardianPair, ElectionPartialKeyBackup]
+    _election_public_keys_snapshot: Optional[Tuple[ElectionPublicKey, ...]]
+    _joint_key: Optional[ElectionJointKey]
+    # Pair keyed stores use plain (owner_id, designated_id) tuples, which hash and
+    # compare equal to the matching GuardianPair but are cheaper to build per receive
+    _election_partial_key_backups: DataStore[
+        Tuple[GUARDIAN_ID, GUARDIAN_ID], ElectionPartialKeyBackup
+    ]
+    _election_partial_key_backups_by_designated: Dict[
+        GUARDIAN_ID, Dict[GUARDIAN_ID, ElectionPartialKeyBackup]
+    ]
     _election_partial_key_challenges: DataStore[
-        GuardianPair, ElectionPartialKeyChallenge
+        Tuple[GUARDIAN_ID, GUARDIAN_ID], ElectionPartialKeyChallenge
     ]
     _election_partial_key_verifications: DataStore[
-        GuardianPair, ElectionPartialKeyVerification
+        Tuple[GUARDIAN_ID, GUARDIAN_ID], ElectionPartialKeyVerification
     ]
-    _guardians: List[Guardian] = []
+    # Keyed by pair with no values, a dict keeps failures in the order they arrived
+    _failed_partial_key_verifications: Dict[Tuple[GUARDIAN_ID, GUARDIAN_ID], None]
+    _backups_verified: Optional[bool]
+    _guardians: List[Guardian]
+    _attendance_count: int
+    _number_of_guardians: int
+    _required_total_backups: int
 
     def __init__(self, ceremony_details: CeremonyDetails):
         self.ceremony_details = ceremony_details
-        self._auxiliary_public_keys = DataStore[GUARDIAN_ID, AuxiliaryPublicKey]()
-        self._election_public_keys = DataStore[GUARDIAN_ID, ElectionPublicKey]()
-        self._election_partial_key_backups = DataStore[
-            GuardianPair, ElectionPartialKeyBackup
-        ]()
-        self._election_partial_key_verifications = DataStore[
-            GuardianPair, ElectionPartialKeyVerification
-        ]()
-        self._election_partial_key_challenges = DataStore[
-            GuardianPair, ElectionPartialKeyChallenge
-        ]()
+        self._number_of_guardians = ceremony_details.number_of_guardians
+        self._required_total_backups = _count_required_backups(ceremony_details)
+        self._auxiliary_public_keys = DataStore()
+        self._auxiliary_public_keys_snapshot = None
+        self._election_public_keys = DataStore()
+        self._election_public_keys_snapshot = None
+        self._joint_key = None
+        self._election_partial_key_backups = DataStore()
+        self._election_partial_key_backups_by_designated = {}
+        self._election_partial_key_verifications = DataStore()
+        self._failed_partial_key_verifications = {}
+        self._backups_verified = None
+        self._election_partial_key_challenges = DataStore()
+        self._guardians = []
+        self._attendance_count = 0
 
     def announce(self, guardian: Guardian) -> None:
         """
@@ -141,12 +189,21 @@ class KeyCeremonyMediator:
         :param ceremony_details: Ceremony details of election
         """
         self.ceremony_details = ceremony_details
+        self._number_of_guardians = ceremony_details.number_of_guardians
+        self._required_total_backups = _count_required_backups(ceremony_details)
         self._auxiliary_public_keys.clear()
+        self._auxiliary_public_keys_snapshot = None
         self._election_public_keys.clear()
+        self._election_public_keys_snapshot = None
+        self._joint_key = None
         self._election_partial_key_backups.clear()
+        self._election_partial_key_backups_by_designated.clear()
         self._election_partial_key_challenges.clear()
         self._election_partial_key_verifications.clear()
+        self._failed_partial_key_verifications.clear()
+        self._backups_verified = None
         self._guardians.clear()
+        self._attendance_count = 0
 
     # Attendance
     def confirm_presence_of_guardian(self, public_key_set: PublicKeySet) -> None:
@@ -154,30 +211,40 @@ class KeyCeremonyMediator:
         Confirm presence of guardian by passing their public key set
         :param public_key_set: Public key set
         """
-        self.receive_auxiliary_public_key(
+        owner_id = public_key_set.owner_id
+        if (
+            owner_id not in self._auxiliary_public_keys
+            or owner_id not in self._election_public_keys
+        ):
+            self._attendance_count += 1
+        # Inlines receive_auxiliary_public_key and receive_election_public_key,
+        # keep the attendance count and cache invalidation here in sync with them
+        self._auxiliary_public_keys.set(
+            owner_id,
             AuxiliaryPublicKey(
-                public_key_set.owner_id,
+                owner_id,
                 public_key_set.sequence_order,
                 public_key_set.auxiliary_public_key,
-            )
+            ),
         )
-        self.receive_election_public_key(
+        self._auxiliary_public_keys_snapshot = None
+        self._election_public_keys.set(
+            owner_id,
             ElectionPublicKey(
-                public_key_set.owner_id,
+                owner_id,
                 public_key_set.election_public_key_proof,
                 public_key_set.election_public_key,
             ),
         )
+        self._election_public_keys_snapshot = None
+        self._joint_key = None
 
     def all_guardians_in_attendance(self) -> bool:
         """
         Check the attendance of all the guardians expected
         :return: True if all guardians in attendance
         """
-        return (
-            self.all_auxiliary_public_keys_available()
-            and self.all_election_public_keys_available()
-        )
+        return self._attendance_count == self._number_of_guardians
 
     def share_guardians_in_attendance(self) -> Iterable[GUARDIAN_ID]:
         """
@@ -192,24 +259,32 @@ class KeyCeremonyMediator:
         Receive auxiliary public key from guardian
         :param public_key: Auxiliary public key
         """
-        self._auxiliary_public_keys.set(public_key.owner_id, public_key)
+        owner_id = public_key.owner_id
+        if (
+            owner_id not in self._auxiliary_public_keys
+            and owner_id in self._election_public_keys
+        ):
+            self._attendance_count += 1
+        self._auxiliary_public_keys.set(owner_id, public_key)
+        self._auxiliary_public_keys_snapshot = None
 
     def all_auxiliary_public_keys_available(self) -> bool:
         """
         True if all auxiliary public key for all guardians available
         :return: All auxiliary public backups for all guardians available
         """
-        return (
-            len(self._auxiliary_public_keys)
-            == self.ceremony_details.number_of_guardians
-        )
+        return len(self._auxiliary_public_keys) == self._number_of_guardians
 
     def share_auxiliary_public_keys(self) -> Iterable[AuxiliaryPublicKey]:
         """
         Share all currently stored auxiliary public keys for all guardians
         :return: list of auxiliary public keys
         """
-        return self._auxiliary_public_keys.values()
+        if self._auxiliary_public_keys_snapshot is None:
+            self._auxiliary_public_keys_snapshot = tuple(
+                self._auxiliary_public_keys.values()
+            )
+        return self._auxiliary_public_keys_snapshot
 
     # Election Public Keys
     def receive_election_public_key(self, public_key: ElectionPublicKey) -> None:
@@ -217,23 +292,33 @@ class KeyCeremonyMediator:
         Receive election public key from guardian
         :param public_key: election public key
         """
-        self._election_public_keys.set(public_key.owner_id, public_key)
+        owner_id = public_key.owner_id
+        if (
+            owner_id not in self._election_public_keys
+            and owner_id in self._auxiliary_public_keys
+        ):
+            self._attendance_count += 1
+        self._election_public_keys.set(owner_id, public_key)
+        self._election_public_keys_snapshot = None
+        self._joint_key = None
 
     def all_election_public_keys_available(self) -> bool:
         """
         True if all election public keys for all guardians available
         :return: All election public keys for all guardians available
         """
-        return (
-            len(self._election_public_keys) == self.ceremony_details.number_of_guardians
-        )
+        return len(self._election_public_keys) == self._number_of_guardians
 
     def share_election_public_keys(self) -> Iterable[ElectionPublicKey]:
         """
         Share all currently stored election public keys for all guardians
         :return: list of election public keys
         """
-        return self._election_public_keys.values()
+        if self._election_public_keys_snapshot is None:
+            self._election_public_keys_snapshot = tuple(
+                self._election_public_keys.values()
+            )
+        return self._election_public_keys_snapshot
 
     # Election Partial Key Backups
     def receive_election_partial_key_backup(
@@ -247,8 +332,12 @@ class KeyCeremonyMediator:
         if backup.owner_id == backup.designated_id:
             return False
         self._election_partial_key_backups.set(
-            GuardianPair(backup.owner_id, backup.designated_id), backup
+            (backup.owner_id, backup.designated_id), backup
         )
+        self._election_partial_key_backups_by_designated.setdefault(
+            backup.designated_id, {}
+        )[backup.owner_id] = backup
+        self._backups_verified = None
         return True
 
     def all_election_partial_key_backups_available(self) -> bool:
@@ -256,11 +345,7 @@ class KeyCeremonyMediator:
         True if all election partial key backups for all guardians available
         :return: All election partial key backups for all guardians available
         """
-        required_backups_per_guardian = self.ceremony_details.number_of_guardians - 1
-        return (
-            len(self._election_partial_key_backups)
-            == required_backups_per_guardian * self.ceremony_details.number_of_guardians
-        )
+        return len(self._election_partial_key_backups) == self._required_total_backups
 
     def share_election_partial_key_backups_to_guardian(
         self, guardian_id: GUARDIAN_ID
@@ -270,15 +355,10 @@ class KeyCeremonyMediator:
         :param guardian_id: Recipients guardian id
         :return: List of guardians designated backups
         """
-        backups: List[ElectionPartialKeyBackup] = []
-        for current_guardian_id in self.share_guardians_in_attendance():
-            if guardian_id != current_guardian_id:
-                backup = self._election_partial_key_backups.get(
-                    GuardianPair(current_guardian_id, guardian_id)
-                )
-                if backup is not None:
-                    backups.append(backup)
-        return backups
+        backups = self._election_partial_key_backups_by_designated.get(guardian_id)
+        if backups is None:
+            return []
+        return list(backups.values())
 
     # Partial Key Verifications
     def receive_election_partial_key_verification(
@@ -290,36 +370,96 @@ class KeyCeremonyMediator:
         """
         if verification.owner_id == verification.designated_id:
             return
-        self._election_partial_key_verifications.set(
-            GuardianPair(verification.owner_id, verification.designated_id),
-            verification,
-        )
+        pair = (verification.owner_id, verification.designated_id)
+        self._election_partial_key_verifications.set(pair, verification)
+        if verification.verified:
+            self._failed_partial_key_verifications.pop(pair, None)
+        else:
+            self._failed_partial_key_verifications[pair] = None
+        self._backups_verified = None
 
     def all_election_partial_key_verifications_received(self) -> bool:
         """
         True if all election partial key verifications recieved
         :return: All election partial key verifications received
         """
-        required_verifications_per_guardian = (
-            self.ceremony_details.number_of_guardians - 1
-        )
         return (
             len(self._election_partial_key_verifications)
-            == required_verifications_per_guardian
-            * self.ceremony_details.number_of_guardians
+            == self._required_total_backups
         )
 
     def all_election_partial_key_backups_verified(self) -> bool:
         """
-        True if all election partial key backups verified
+        True if all election partial key backups verified by their guardians
+        and the coefficient proofs of every received backup are valid.
+        The result is kept until another backup or verification is received.
         :return: All election partial key backups verified
         """
-        if not self.all_election_partial_key_verifications_received():
-            return False
-        for verification in self._election_partial_key_verifications.values():
-            if not verification.verified:
+        if self._backups_verified is None:
+            self._backups_verified = (
+                not self._failed_partial_key_verifications
+                and self.all_election_partial_key_verifications_received()
+                and self.batch_verify_received_backups()
+            )
+        return self._backups_verified
+
+    def batch_verify_received_backups(
+        self, scheduler: Optional[Scheduler] = None
+    ) -> bool:
+        """
+        Verify the coefficient proofs of all received election partial key backups
+        in batches, one per owner verified in parallel when there are enough owners,
+        falling back to checking each owner's distinct proofs to report the invalid ones
+        :param scheduler: Scheduler used to verify the owner batches in parallel
+        :return: True if all coefficient proofs are valid, else False
+        """
+        owner_backups: DefaultDict[
+            GUARDIAN_ID, List[ElectionPartialKeyBackup]
+        ] = defaultdict(list)
+        for backup in self._election_partial_key_backups.values():
+            if not _coefficient_proofs_match_commitments(backup):
+                log_warning(
+                    f"batch_verify_received_backups coefficient proofs do not match commitments in backup from {backup.owner_id} for {backup.designated_id}"
+                )
                 return False
-        return True
+            owner_backups[backup.owner_id].append(backup)
+
+        owner_proofs = [
+            [proof for backup in backups for proof in backup.coefficient_proofs]
+            for backups in owner_backups.values()
+        ]
+
+        verified: Optional[bool] = None
+        if len(owner_proofs) >= PARALLEL_VERIFICATION_MIN_GUARDIANS:
+            if scheduler is None:
+                scheduler = Scheduler()
+            results: List[bool] = scheduler.schedule(
+                batch_verify_schnorr_proofs,
+                [(proofs,) for proofs in owner_proofs],
+            )
+            # the scheduler returns no results if any task failed, verify serially then
+            if len(results) == len(owner_proofs):
+                verified = all(results)
+        if verified is None:
+            verified = batch_verify_schnorr_proofs(
+                [proof for proofs in owner_proofs for proof in proofs]
+            )
+
+        if verified:
+            return True
+
+        for backups in owner_backups.values():
+            # an owner's backups usually repeat the same proofs, check each one once
+            validity: Dict[SchnorrProof, bool] = {}
+            for backup in backups:
+                for proof in backup.coefficient_proofs:
+                    if proof not in validity:
+                        validity[proof] = proof.is_valid()
+                if not all(validity[proof] for proof in backup.coefficient_proofs):
+                    log_warning(
+                        f"batch_verify_received_backups invalid coefficient proof in backup from {backup.owner_id} for {backup.designated_id}"
+                    )
+        return False
 
     # Partial Key Challenges
     def share_failed_partial_key_verifications(self) -> List[GuardianPair]:
@@ -327,21 +467,22 @@ class KeyCeremonyMediator:
         Share list of guardians with failed partial key backup verifications
         :return: List of guardian pairs with failed verifications
         """
-        failed_verifications: List[GuardianPair] = []
-        for pair, verification in self._election_partial_key_verifications.items():
-            if not verification.verified:
-                failed_verifications.append(pair)
-        return failed_verifications
+        return [
+            GuardianPair(owner_id, designated_id)
+            for owner_id, designated_id in self._failed_partial_key_verifications
+        ]
 
     def share_missing_election_partial_key_challenges(self) -> List[GuardianPair]:
         """
         Share list of guardians with missing election partial key challenges
         :return: List of guardian pairs with failed verifications and no challenges
         """
-        failed_verifications = self.share_failed_partial_key_verifications()
-        for pair in self._election_partial_key_challenges.keys():
-            failed_verifications.remove(pair)
-        return failed_verifications
+        challenged_pairs = set(self._election_partial_key_challenges.keys())
+        return [
+            pair
+            for pair in self.share_failed_partial_key_verifications()
+            if pair not in challenged_pairs
+        ]
 
     def receive_election_partial_key_challenge(
         self, challenge: ElectionPartialKeyChallenge
@@ -351,7 +492,7 @@ class KeyCeremonyMediator:
         :param challenge: Election partial key challenge
         """
         self._election_partial_key_challenges.set(
-            GuardianPair(challenge.owner_id, challenge.designated_id), challenge
+            (challenge.owner_id, challenge.designated_id), challenge
         )
 
     def share_open_election_partial_key_challenges(
@@ -373,4 +514,30 @@ class KeyCeremonyMediator:
             return None
         if not self.all_election_partial_key_backups_verified():
             return None
-        return combine_election_public_keys(self._election_public_keys)
+        if self._joint_key is None:
+            self._joint_key = combine_election_public_keys(self._election_public_keys)
+        return self._joint_key
+
+
+def _count_required_backups(ceremony_details: CeremonyDetails) -> int:
+    """
+    Number of partial key backups (and verifications) needed for the ceremony,
+    one from each guardian to every other guardian
+    :param ceremony_details: Ceremony details of election
+    :return: Total count of required backups
+    """
+    number_of_guardians = ceremony_details.number_of_guardians
+    return (number_of_guardians - 1) * number_of_guardians
+
+
+def _coefficient_proofs_match_commitments(backup: ElectionPartialKeyBackup) -> bool:
+    """
+    Check each coefficient proof of the backup is for the matching coefficient commitment
+    :param backup: Election partial key backup
+    :return: True if there is one proof per commitment, each for that commitment
+    """
+    proofs = backup.coefficient_proofs
+    commitments = backup.coefficient_commitments
+    return len(proofs) == len(commitments) and all(
+        proof.public_key == commitment for proof, commitment in zip(proofs, commitments)
+    )
@@ -1,10 +1,16 @@
+from collections import defaultdict
 from dataclasses import dataclass
+from secrets import randbelow
+from typing import DefaultDict, List, Sequence
 
 from .elgamal import ElGamalKeyPair
 from .group import (
     ElementModQ,
     ElementModP,
+    Q,
     g_pow_p,
+    int_to_p_unchecked,
+    int_to_q_unchecked,
     mult_p,
     pow_p,
     a_plus_bc_q,
@@ -13,6 +19,9 @@ from .hash import hash_elems
 from .logs import log_warning
 from .proof import Proof, ProofUsage
 
+BATCH_VERIFICATION_BITS = 128
+"""Size in bits of the random scalars used to combine proofs in batch verification"""
+
 
 @dataclass(frozen=True)
 class SchnorrProof(Proof):
@@ -81,3 +90,46 @@ def make_schnorr_proof(keypair: ElGamalKeyPair, r: ElementModQ) -> SchnorrProof:
     u = a_plus_bc_q(r, keypair.secret_key, c)
 
     return SchnorrProof(k, h, c, u)
+
+
+def batch_verify_schnorr_proofs(proofs: Sequence[SchnorrProof]) -> bool:
+    """
+    Check validity of a collection of Schnorr proofs at once by checking a random linear
+    combination of their equations, `g^(sum z_i * u_i) == prod (h_i * k_i^c_i)^z_i`,
+    with a fresh random `z_i` per proof. An invalid proof slips through with probability
+    at most 2^-`BATCH_VERIFICATION_BITS`.  Proofs sharing a public key or commitment
+    have their exponents summed, so each distinct element is exponentiated once.
+
+    Unlike `SchnorrProof.is_valid`, the commitment `h` must also be a valid residue, since
+    a component outside the subgroup could otherwise cancel out in the combination.  Any
+    honest proof satisfies this.
+
+    :param proofs: The proofs to check
+    :return: true if every proof is valid, false if any is wrong. Use `is_valid` on each
+             proof to find the invalid one.
+    """
+    response_sum = 0
+    exponents: DefaultDict[int, int] = defaultdict(int)
+    for proof in proofs:
+        k = proof.public_key
+        h = proof.commitment
+        u = proof.response
+        if not u.is_in_bounds():
+            return False
+
+        c = hash_elems(k, h)
+        z = randbelow(2 ** BATCH_VERIFICATION_BITS - 1) + 1
+        response_sum += z * u.to_int()
+        # Coalesce terms that share a base, such as a guardian's coefficient commitments
+        # repeated across all of its backups, so each distinct base is raised only once
+        exponents[h.to_int()] += z
+        exponents[k.to_int()] += z * c.to_int()
+
+    terms: List[ElementModP] = []
+    for base, exponent in exponents.items():
+        element = int_to_p_unchecked(base)
+        if not element.is_valid_residue():
+            return False
+        terms.append(pow_p(element, int_to_q_unchecked(exponent % Q)))
+
+    return g_pow_p(int_to_q_unchecked(response_sum % Q)) == mult_p(*terms)
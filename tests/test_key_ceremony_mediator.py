@@ -1,12 +1,20 @@
 from unittest import TestCase
+from unittest.mock import patch
 
+from electionguard.group import ONE_MOD_Q, add_q
 from electionguard.guardian import Guardian
 from electionguard.key_ceremony import (
     CeremonyDetails,
+    ElectionPartialKeyBackup,
     ElectionPartialKeyVerification,
     GuardianPair,
 )
-from electionguard.key_ceremony_mediator import KeyCeremonyMediator
+from electionguard.key_ceremony_mediator import (
+    KeyCeremonyMediator,
+    PARALLEL_VERIFICATION_MIN_GUARDIANS,
+)
+from electionguard.scheduler import Scheduler
+from electionguard.schnorr import SchnorrProof
 
 identity_auxiliary_decrypt = lambda message, public_key: message
 identity_auxiliary_encrypt = lambda message, private_key: message
@@ -27,6 +35,35 @@ GUARDIAN_1.generate_election_partial_key_backups(identity_auxiliary_encrypt)
 GUARDIAN_2.generate_election_partial_key_backups(identity_auxiliary_encrypt)
 
 
+def _with_invalid_coefficient_proof(
+    backup: ElectionPartialKeyBackup,
+) -> ElectionPartialKeyBackup:
+    """Copy of the backup with a tampered response in its first coefficient proof"""
+    proof = backup.coefficient_proofs[0]
+    bad_proof = SchnorrProof(
+        proof.public_key,
+        proof.commitment,
+        proof.challenge,
+        add_q(proof.response, ONE_MOD_Q),
+    )
+    return backup._replace(
+        coefficient_proofs=[bad_proof] + backup.coefficient_proofs[1:]
+    )
+
+
+def _orchestrated_mediator(number_of_guardians: int) -> KeyCeremonyMediator:
+    """Mediator with the backups of newly announced guardians orchestrated"""
+    mediator = KeyCeremonyMediator(
+        CeremonyDetails(number_of_guardians, number_of_guardians)
+    )
+    for i in range(1, number_of_guardians + 1):
+        mediator.announce(
+            Guardian(f"Guardian {i}", i, number_of_guardians, number_of_guardians)
+        )
+    mediator.orchestrate(identity_auxiliary_encrypt)
+    return mediator
+
+
 class TestKeyCeremonyMediator(TestCase):
     def test_reset(self):
         # Arrange
@@ -59,6 +96,25 @@ class TestKeyCeremonyMediator(TestCase):
         self.assertIsNotNone(guardians)
         self.assertEqual(len(guardians), NUMBER_OF_GUARDIANS)
 
+    def test_mediator_takes_attendance_from_separate_keys(self):
+        # Arrange
+        mediator = KeyCeremonyMediator(CEREMONY_DETAILS)
+
+        # Act
+        mediator.receive_auxiliary_public_key(GUARDIAN_1.share_auxiliary_public_key())
+        mediator.receive_election_public_key(GUARDIAN_1.share_election_public_key())
+        mediator.confirm_presence_of_guardian(GUARDIAN_1.share_public_keys())
+        mediator.receive_election_public_key(GUARDIAN_2.share_election_public_key())
+
+        # Assert
+        self.assertFalse(mediator.all_guardians_in_attendance())
+
+        # Act
+        mediator.receive_auxiliary_public_key(GUARDIAN_2.share_auxiliary_public_key())
+
+        # Assert
+        self.assertTrue(mediator.all_guardians_in_attendance())
+
     def test_exchange_of_auxiliary_public_keys(self):
         # Arrange
         mediator = KeyCeremonyMediator(CEREMONY_DETAILS)
@@ -149,6 +205,102 @@ class TestKeyCeremonyMediator(TestCase):
         self.assertEqual(guardian1_backups[0], backup_from_2_for_1)
         self.assertEqual(guardian2_backups[0], backup_from_1_for_2)
 
+    def test_batch_verify_received_backups(self):
+        # Arrange
+        mediator = KeyCeremonyMediator(CEREMONY_DETAILS)
+        backup = GUARDIAN_1.share_election_partial_key_backup(GUARDIAN_2_ID)
+
+        # Act
+        mediator.receive_election_partial_key_backup(backup)
+        mediator.receive_election_partial_key_backup(
+            GUARDIAN_2.share_election_partial_key_backup(GUARDIAN_1_ID)
+        )
+
+        # Assert
+        self.assertTrue(mediator.batch_verify_received_backups())
+
+        # Act
+        mediator.receive_election_partial_key_backup(
+            _with_invalid_coefficient_proof(backup)
+        )
+
+        # Assert
+        self.assertFalse(mediator.batch_verify_received_backups())
+
+    def test_batch_verify_received_backups_in_parallel(self):
+        # Arrange
+        mediator = _orchestrated_mediator(PARALLEL_VERIFICATION_MIN_GUARDIANS)
+        backups = mediator.share_election_partial_key_backups_to_guardian(GUARDIAN_2_ID)
+        scheduler = Scheduler()
+
+        # Act
+        verified = mediator.batch_verify_received_backups(scheduler)
+
+        # Assert
+        self.assertTrue(verified)
+
+        # Act
+        scheduler.close()
+        verified_without_pool = mediator.batch_verify_received_backups(scheduler)
+
+        # Assert
+        self.assertTrue(verified_without_pool)
+
+        # Act
+        scheduler = Scheduler()
+        mediator.receive_election_partial_key_backup(
+            _with_invalid_coefficient_proof(backups[0])
+        )
+        verified_with_bad_proof = mediator.batch_verify_received_backups(scheduler)
+        scheduler.close()
+
+        # Assert
+        self.assertFalse(verified_with_bad_proof)
+
+    def test_scheduler_failure_does_not_block_joint_key(self):
+        # Arrange
+        mediator = _orchestrated_mediator(PARALLEL_VERIFICATION_MIN_GUARDIANS)
+
+        # Act
+        with patch.object(Scheduler, "schedule", return_value=[]):
+            verified = mediator.verify(identity_auxiliary_decrypt)
+        joint_key = mediator.publish_joint_key()
+
+        # Assert
+        self.assertTrue(verified)
+        self.assertTrue(mediator.all_election_partial_key_backups_verified())
+        self.assertIsNotNone(joint_key)
+
+    def test_invalid_coefficient_proof_blocks_joint_key(self):
+        # Arrange
+        mediator = KeyCeremonyMediator(CEREMONY_DETAILS)
+        mediator.confirm_presence_of_guardian(GUARDIAN_1.share_public_keys())
+        mediator.confirm_presence_of_guardian(GUARDIAN_2.share_public_keys())
+        mediator.receive_election_partial_key_backup(
+            _with_invalid_coefficient_proof(
+                GUARDIAN_1.share_election_partial_key_backup(GUARDIAN_2_ID)
+            )
+        )
+        mediator.receive_election_partial_key_backup(
+            GUARDIAN_2.share_election_partial_key_backup(GUARDIAN_1_ID)
+        )
+
+        # Act
+        for owner_id, designated_id in [
+            (GUARDIAN_1_ID, GUARDIAN_2_ID),
+            (GUARDIAN_2_ID, GUARDIAN_1_ID),
+        ]:
+            mediator.receive_election_partial_key_verification(
+                ElectionPartialKeyVerification(
+                    owner_id, designated_id, designated_id, True
+                )
+            )
+
+        # Assert
+        self.assertTrue(mediator.all_election_partial_key_verifications_received())
+        self.assertFalse(mediator.all_election_partial_key_backups_verified())
+        self.assertIsNone(mediator.publish_joint_key())
+
     # Partial Key Verifications
     def test_partial_key_backup_verification_success(self):
         """
@@ -193,6 +345,7 @@ class TestKeyCeremonyMediator(TestCase):
         self.assertTrue(mediator.all_election_partial_key_verifications_received())
         self.assertTrue(mediator.all_election_partial_key_backups_verified())
         self.assertIsNotNone(joint_key)
+        self.assertIs(mediator.publish_joint_key(), joint_key)
 
     def test_partial_key_backup_verification_failure(self):
         """
@@ -266,3 +419,19 @@ class TestKeyCeremonyMediator(TestCase):
         self.assertEqual(len(challenges), 1)
         self.assertTrue(mediator.all_election_partial_key_backups_verified())
         self.assertIsNotNone(joint_key)
+
+    def test_missing_challenges_ignore_challenge_without_failed_verification(self):
+        # Arrange
+        mediator = KeyCeremonyMediator(CEREMONY_DETAILS)
+        mediator.receive_election_partial_key_backup(
+            GUARDIAN_1.share_election_partial_key_backup(GUARDIAN_2_ID)
+        )
+        challenge = GUARDIAN_1.publish_election_backup_challenge(GUARDIAN_2_ID)
+
+        # Act
+        mediator.receive_election_partial_key_challenge(challenge)
+        missing_challenges = mediator.share_missing_election_partial_key_challenges()
+
+        # Assert
+        self.assertEqual(len(mediator.share_failed_partial_key_verifications()), 0)
+        self.assertEqual(len(missing_challenges), 0)
@@ -13,6 +13,7 @@ from electionguard.group import (
     ONE_MOD_Q,
 )
 from electionguard.schnorr import (
+    batch_verify_schnorr_proofs,
     make_schnorr_proof,
     SchnorrProof,
 )
@@ -85,3 +86,35 @@ class TestSchnorr(unittest.TestCase):
         )
         self.assertFalse(proof2.is_valid())
         self.assertFalse(proof3.is_valid())
+
+    @given(elgamal_keypairs(), elements_mod_q(), elgamal_keypairs(), elements_mod_q())
+    def test_batch_verify_schnorr_proofs_valid(
+        self,
+        keypair1: ElGamalKeyPair,
+        nonce1: ElementModQ,
+        keypair2: ElGamalKeyPair,
+        nonce2: ElementModQ,
+    ) -> None:
+        proofs = [
+            make_schnorr_proof(keypair1, nonce1),
+            make_schnorr_proof(keypair2, nonce2),
+        ]
+        self.assertTrue(batch_verify_schnorr_proofs(proofs))
+        self.assertTrue(batch_verify_schnorr_proofs(proofs + proofs))
+        self.assertTrue(batch_verify_schnorr_proofs([]))
+
+    @given(elgamal_keypairs(), elements_mod_q(), elements_mod_q(), elements_mod_q())
+    def test_batch_verify_schnorr_proofs_invalid_u(
+        self,
+        keypair: ElGamalKeyPair,
+        nonce1: ElementModQ,
+        nonce2: ElementModQ,
+        other: ElementModQ,
+    ) -> None:
+        proof = make_schnorr_proof(keypair, nonce1)
+        proof_bad = make_schnorr_proof(keypair, nonce2)
+        assume(other != proof_bad.response)
+        proof_bad = SchnorrProof(
+            proof_bad.public_key, proof_bad.commitment, proof_bad.challenge, other
+        )
+        self.assertFalse(batch_verify_schnorr_proofs([proof, proof_bad]))